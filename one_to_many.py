@@ -1,17 +1,59 @@
 # main.py
 
-from fastapi import FastAPI, Depends, HTTPException
-from sqlalchemy import create_engine, Column, Integer, String, Float, ForeignKey
+import os
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+
+from cachetools import TTLCache
+from fastapi import FastAPI, Body, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import bindparam, delete, event, insert, select, Column, Integer, String, Float, ForeignKey
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship, Session
-from pydantic import BaseModel
+from sqlalchemy.orm import relationship, joinedload, selectinload, raiseload, load_only
+from pydantic import BaseModel, ConfigDict, Field, AliasChoices, AliasPath, TypeAdapter
 from typing import List
 
 # Database setup
-DATABASE_URL = "sqlite:///./ecommerce.db"
-
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+DATABASE_URL = "sqlite+aiosqlite:///./ecommerce.db"
+
+# Size the pool for concurrent requests instead of the default 5 + 10 overflow;
+# pre-ping discards dead connections and recycle caps a connection's lifetime
+engine = create_async_engine(
+    DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    pool_size=20,
+    max_overflow=10,
+    pool_timeout=30,
+    pool_pre_ping=True,
+    pool_recycle=3600,
+)
+
+# SQLite pragmas applied to every new connection: WAL lets readers run alongside
+# a writer and synchronous=NORMAL needs one fsync per commit instead of two
+@event.listens_for(engine.sync_engine, "connect")
+def _sqlite_pragmas(dbapi_con, connection_record):
+    cursor = dbapi_con.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.execute("PRAGMA cache_size=-65536")  # 64 MiB page cache
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+# Per-request count of SQL statements, reported in the X-SQL-Count response header
+# so N+1 regressions show up as soon as an endpoint's count grows with its data.
+# Off by default; set SQL_COUNT_HEADER=1 to install the listener and middleware
+SQL_COUNT_ENABLED = os.environ.get("SQL_COUNT_HEADER") == "1"
+sql_statement_count = ContextVar("sql_statement_count", default=None)
+
+if SQL_COUNT_ENABLED:
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _count_sql_statements(conn, cursor, statement, parameters, context, executemany):
+        counter = sql_statement_count.get()
+        if counter is not None:
+            counter[0] += 1
+
+SessionLocal = async_sessionmaker(engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 # Models
@@ -21,8 +63,9 @@ class User(Base):
     username = Column(String, unique=True, index=True, nullable=False)
     email = Column(String, unique=True, index=True, nullable=False)
     
-    # One-to-Many relationship with orders
-    orders = relationship("Order", back_populates="user",cascade="all, delete-orphan")
+    # One-to-Many relationship with orders; deleting a user leaves removing its
+    # orders to the database's ON DELETE CASCADE instead of loading them first
+    orders = relationship("Order", back_populates="user",cascade="all, delete-orphan", passive_deletes=True)
 
     def __repr__(self):
         return f"<User(id={self.id}, username={self.username}, email={self.email})>"
@@ -34,7 +77,7 @@ class Order(Base):
     product_name = Column(String, index=True, nullable=False)
     quantity = Column(Integer, nullable=False)
     price = Column(Float, nullable=False)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
     
     # Back reference to User
     user = relationship("User", back_populates="orders")
@@ -42,19 +85,70 @@ class Order(Base):
     def __repr__(self):
         return f"<Order(id={self.id}, product_name={self.product_name}, quantity={self.quantity}, price={self.price}, user_id={self.user_id})>"
 
-# Create tables in the database
-Base.metadata.create_all(bind=engine)
+# Statements built once at import so every request reuses the same compiled SQL;
+# limit/offset are bound per request
+USERS_PAGE = (
+    select(User)
+    .options(
+        load_only(User.id, User.username, User.email),
+        selectinload(User.orders).load_only(
+            Order.id, Order.product_name, Order.quantity, Order.price, Order.user_id
+        ),
+        raiseload("*", sql_only=True),
+    )
+    .order_by(User.id)
+    .limit(bindparam("limit"))
+    .offset(bindparam("offset"))
+)
+
+ORDERS_PAGE = (
+    select(Order)
+    .options(
+        load_only(Order.id, Order.product_name, Order.quantity, Order.price, Order.user_id),
+        joinedload(Order.user).load_only(User.username),
+        raiseload("*", sql_only=True),
+    )
+    .order_by(Order.id)
+    .limit(bindparam("limit"))
+    .offset(bindparam("offset"))
+)
+
+# Executed with a list of parameter dicts, this runs as one cursor.executemany,
+# leaving the per-row parameter binding to sqlite3's C loop
+ORDERS_INSERT = insert(Order)
+
+# Create tables in the database on startup
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield
+    await engine.dispose()
 
 # FastAPI app instance
-app = FastAPI()
-
-# Dependency to get a new session per request
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+app = FastAPI(lifespan=lifespan)
+
+if SQL_COUNT_ENABLED:
+    @app.middleware("http")
+    async def add_sql_count_header(request: Request, call_next):
+        counter = [0]
+        token = sql_statement_count.set(counter)
+        try:
+            response = await call_next(request)
+        finally:
+            sql_statement_count.reset(token)
+        response.headers["X-SQL-Count"] = str(counter[0])
+        return response
+
+# Dependency to get a new session per request;
+# the context manager always closes it and a failed request is rolled back
+async def get_db():
+    async with SessionLocal() as db:
+        try:
+            yield db
+        except Exception:
+            await db.rollback()
+            raise
 
 # Pydantic Schemas
 class OrderBase(BaseModel):
@@ -68,10 +162,10 @@ class OrderCreate(OrderBase):
 class OrderResponse(OrderBase):
     id: int
     user_id: int
-    username: str
+    # Read from the eagerly loaded Order.user when validating ORM objects
+    username: str = Field(validation_alias=AliasChoices("username", AliasPath("user", "username")))
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class UserBase(BaseModel):
     username: str
@@ -85,36 +179,55 @@ class UserResponse(UserBase):
     orders: List[OrderResponse] = []
 
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+# List adapters are built once; validating and dumping a whole page through them
+# stays inside pydantic-core instead of going item by item through FastAPI
+ORDERS_ADAPTER = TypeAdapter(List[OrderResponse])
+USERS_ADAPTER = TypeAdapter(List[UserResponse])
+
+# Short-lived in-process caches of serialized JSON for the read-heavy endpoints,
+# keyed by user ID, order ID and (limit, offset); writes drop the affected entries
+user_cache = TTLCache(maxsize=10_000, ttl=5)
+order_cache = TTLCache(maxsize=10_000, ttl=5)
+orders_page_cache = TTLCache(maxsize=1_000, ttl=5)
 
 # CRUD Operations and Endpoints
 
 @app.post("/users/", response_model=UserResponse)
-def create_user(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = User(username=user.username, email=user.email)
+async def create_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
+    # A new user has no orders yet; setting the collection avoids a lazy load on serialization
+    db_user = User(username=user.username, email=user.email, orders=[])
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
     return db_user
 
 @app.get("/users/{user_id}", response_model=UserResponse)
-def read_user(user_id: int, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
-    if user is None:
-        raise HTTPException(status_code=404, detail="User not found")
-    return user
+async def read_user(user_id: int, db: AsyncSession = Depends(get_db)):
+    body = user_cache.get(user_id)
+    if body is None:
+        user = await db.get(User, user_id, options=[selectinload(User.orders), raiseload("*", sql_only=True)])
+        if user is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        body = user_cache[user_id] = UserResponse.model_validate(user).model_dump_json()
+    return Response(content=body, media_type="application/json")
 
 
 # Updated delete endpoint for users
 @app.delete("/users/{user_id}", response_model=dict)
-def delete_user(user_id: int, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
-    if user is None:
+async def delete_user(user_id: int, db: AsyncSession = Depends(get_db)):
+    # A single DELETE; SQLite removes the user's orders through the foreign key cascade
+    result = await db.execute(
+        delete(User).where(User.id == user_id), execution_options={"synchronize_session": False}
+    )
+    if result.rowcount == 0:
         raise HTTPException(status_code=404, detail="User not found")
     
-    db.delete(user)
-    db.commit()
+    await db.commit()
+    # The user's orders were deleted with it
+    user_cache.pop(user_id, None)
+    order_cache.clear()
+    orders_page_cache.clear()
     
     return {"detail": f"User with ID {user_id} has been deleted successfully"}
 
@@ -122,49 +235,73 @@ def delete_user(user_id: int, db: Session = Depends(get_db)):
 
 
 @app.post("/users/{user_id}/orders/", response_model=OrderResponse)
-def create_order_for_user(user_id: int, order: OrderCreate, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
+async def create_order_for_user(user_id: int, order: OrderCreate, db: AsyncSession = Depends(get_db)):
+    user = await db.get(User, user_id)
     if user is None:
         raise HTTPException(status_code=404, detail="User not found")
     
+    # Attach the already loaded user so its username is available without a lazy load
     db_order = Order(
         product_name=order.product_name,
         quantity=order.quantity,
         price=order.price,
-        user_id=user_id
+        user=user
     )
     db.add(db_order)
-    db.commit()
-    db.refresh(db_order)
+    await db.commit()
+    user_cache.pop(user_id, None)
+    orders_page_cache.clear()
     return db_order
 
-@app.get("/orders/{order_id}", response_model=OrderResponse)
-def read_order(order_id: int, db: Session = Depends(get_db)):
-    order = db.query(Order).filter(Order.id == order_id).first()
-    if order is None:
-        raise HTTPException(status_code=404, detail="Order not found")
-    response = {
-        "id": order.id,
-        "product_name": order.product_name,
-        "quantity": order.quantity,
-        "price": order.price,
-        "user_id": order.user_id,
-        "username": order.user.username  # Include the username here
-    }
-    return response
+@app.post("/users/{user_id}/orders/bulk", response_model=dict)
+async def create_orders_bulk(
+    user_id: int,
+    # An empty list would make the INSERT fall back to a single DEFAULT VALUES row;
+    # the upper bound keeps one request from holding the write lock indefinitely
+    orders: List[OrderCreate] = Body(..., min_length=1, max_length=10_000),
+    db: AsyncSession = Depends(get_db),
+):
+    user = await db.get(User, user_id)
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
 
-@app.get("/orders", response_model=List[OrderResponse])
-def read_order(db: Session = Depends(get_db)):
-    order = db.query(Order).all()
-    if order is None:
-        raise HTTPException(status_code=404, detail="Order not found")
-    for i in order:
-        i.username =  i.user.username
+    # Insert every order with a single executemany round trip in one transaction
+    await db.execute(ORDERS_INSERT, [{**order.model_dump(), "user_id": user_id} for order in orders])
+    await db.commit()
+    user_cache.pop(user_id, None)
+    orders_page_cache.clear()
 
-    return order
+    return {"detail": f"{len(orders)} orders created for user with ID {user_id}"}
 
-@app.get("/users/") # response_model=List[UserResponse]
-def read_users(db: Session = Depends(get_db)):
+@app.get("/orders/{order_id}", response_model=OrderResponse)
+async def read_order(order_id: int, db: AsyncSession = Depends(get_db)):
+    body = order_cache.get(order_id)
+    if body is None:
+        order = await db.get(
+            Order, order_id, options=[joinedload(Order.user).load_only(User.username), raiseload("*", sql_only=True)]
+        )
+        if order is None:
+            raise HTTPException(status_code=404, detail="Order not found")
+        # OrderResponse reads the username from the joined Order.user
+        body = order_cache[order_id] = OrderResponse.model_validate(order).model_dump_json()
+    return Response(content=body, media_type="application/json")
 
-    users = db.query(User).all()
-    return users
+@app.get("/orders", response_model=List[OrderResponse])
+async def read_order(limit: int = Query(50, ge=1, le=500), offset: int = Query(0, ge=0), db: AsyncSession = Depends(get_db)):
+    body = orders_page_cache.get((limit, offset))
+    if body is None:
+        # Load each order's username in the same query instead of one SELECT per order
+        result = await db.execute(ORDERS_PAGE, {"limit": limit, "offset": offset})
+        order = result.scalars().all()
+        body = orders_page_cache[(limit, offset)] = ORDERS_ADAPTER.dump_json(ORDERS_ADAPTER.validate_python(order))
+
+    return Response(content=body, media_type="application/json")
+
+@app.get("/users/", response_model=List[UserResponse])
+async def read_users(limit: int = Query(50, ge=1, le=500), offset: int = Query(0, ge=0), db: AsyncSession = Depends(get_db)):
+    # Load the orders of every user with a single extra `WHERE user_id IN (...)` query
+    # Only the columns UserResponse/OrderResponse serialize are selected
+    result = await db.execute(USERS_PAGE, {"limit": limit, "offset": offset})
+    users = result.scalars().all()
+    body = USERS_ADAPTER.dump_json(USERS_ADAPTER.validate_python(users))
+    return Response(content=body, media_type="application/json")
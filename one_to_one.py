@@ -1,16 +1,55 @@
-from fastapi import FastAPI, Depends, HTTPException
-from sqlalchemy import Column, Integer, String, ForeignKey, create_engine
-from sqlalchemy.orm import sessionmaker, relationship, declarative_base, Session
-from pydantic import BaseModel
-from typing import List
+import os
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
 
-# FastAPI app initialize
-app = FastAPI()
+from cachetools import TTLCache
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import Column, Integer, String, ForeignKey, bindparam, event, select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import relationship, declarative_base, selectinload, raiseload, load_only
+from pydantic import BaseModel, ConfigDict, TypeAdapter
+from typing import List
 
 # SQLite database configuration
-DATABASE_URL = "sqlite:///./test.db"
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+DATABASE_URL = "sqlite+aiosqlite:///./test.db"
+# Size the pool for concurrent requests instead of the default 5 + 10 overflow;
+# pre-ping discards dead connections and recycle caps a connection's lifetime
+engine = create_async_engine(
+    DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    pool_size=20,
+    max_overflow=10,
+    pool_timeout=30,
+    pool_pre_ping=True,
+    pool_recycle=3600,
+)
+
+# SQLite pragmas applied to every new connection: WAL lets readers run alongside
+# a writer and synchronous=NORMAL needs one fsync per commit instead of two
+@event.listens_for(engine.sync_engine, "connect")
+def _sqlite_pragmas(dbapi_con, connection_record):
+    cursor = dbapi_con.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.execute("PRAGMA cache_size=-65536")  # 64 MiB page cache
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+# Per-request count of SQL statements, reported in the X-SQL-Count response header
+# so N+1 regressions show up as soon as an endpoint's count grows with its data.
+# Off by default; set SQL_COUNT_HEADER=1 to install the listener and middleware
+SQL_COUNT_ENABLED = os.environ.get("SQL_COUNT_HEADER") == "1"
+sql_statement_count = ContextVar("sql_statement_count", default=None)
+
+if SQL_COUNT_ENABLED:
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _count_sql_statements(conn, cursor, statement, parameters, context, executemany):
+        counter = sql_statement_count.get()
+        if counter is not None:
+            counter[0] += 1
+
+SessionLocal = async_sessionmaker(engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 
 # Base model for SQLAlchemy
 Base = declarative_base()
@@ -26,11 +65,55 @@ class Profile(Base):
     __tablename__ = 'profiles'
     id = Column(Integer, primary_key=True, index=True)
     bio = Column(String)
-    user_id = Column(Integer, ForeignKey('users.id'),unique=True) # Enforcing unique constraint
+    user_id = Column(Integer, ForeignKey('users.id'), unique=True, index=True) # Enforcing unique constraint
     user = relationship("User", back_populates="profile")
 
-# Create tables in the database
-Base.metadata.create_all(bind=engine)
+# Statements built once at import so every request reuses the same compiled SQL;
+# filter values and limit/offset are bound per request
+USERS_PAGE = (
+    select(User)
+    .options(
+        load_only(User.id, User.name),
+        selectinload(User.profile).load_only(Profile.bio),
+        raiseload("*", sql_only=True),
+    )
+    .order_by(User.id)
+    .limit(bindparam("limit"))
+    .offset(bindparam("offset"))
+)
+
+PROFILES_PAGE = (
+    select(Profile)
+    .options(load_only(Profile.id, Profile.bio, Profile.user_id), raiseload("*", sql_only=True))
+    .order_by(Profile.id)
+    .limit(bindparam("limit"))
+    .offset(bindparam("offset"))
+)
+
+PROFILE_BY_USER_ID = select(Profile).where(Profile.user_id == bindparam("user_id"))
+
+# Create tables in the database on startup
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield
+    await engine.dispose()
+
+# FastAPI app initialize
+app = FastAPI(lifespan=lifespan)
+
+if SQL_COUNT_ENABLED:
+    @app.middleware("http")
+    async def add_sql_count_header(request: Request, call_next):
+        counter = [0]
+        token = sql_statement_count.set(counter)
+        try:
+            response = await call_next(request)
+        finally:
+            sql_statement_count.reset(token)
+        response.headers["X-SQL-Count"] = str(counter[0])
+        return response
 
 # Pydantic models for request and response
 class UserCreate(BaseModel):
@@ -43,8 +126,7 @@ class UserResponse(BaseModel):
     bio: str  # Directly include bio here for user response
     company: str = "Bharat Pvt"
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class ProfileCreate(BaseModel):
     bio: str
@@ -55,44 +137,51 @@ class ProfileResponse(BaseModel):
     bio: str
     user_id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+# List adapters are built once; dumping a whole page through them stays inside
+# pydantic-core instead of going item by item through FastAPI
+PROFILES_ADAPTER = TypeAdapter(List[ProfileResponse])
+USERS_ADAPTER = TypeAdapter(List[UserResponse])
 
-# Dependency to get database session
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Short-lived in-process caches of serialized JSON for the read-heavy endpoints,
+# keyed by user ID and (limit, offset); writes drop the affected entries
+user_cache = TTLCache(maxsize=10_000, ttl=5)
+profiles_page_cache = TTLCache(maxsize=1_000, ttl=5)
+
+# Dependency to get database session;
+# the context manager always closes it and a failed request is rolled back
+async def get_db():
+    async with SessionLocal() as db:
+        try:
+            yield db
+        except Exception:
+            await db.rollback()
+            raise
 
 # Endpoint to create a new user with profile
 @app.post("/users/", response_model=UserResponse)
-def create_user(user: UserCreate, db: Session = Depends(get_db)):
-    # Create a new User instance
-    db_user = User(name=user.name)
+async def create_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
+    # Create a new User instance with its Profile linked through the relationship,
+    # so both rows are inserted in a single transaction
+    db_user = User(name=user.name, profile=Profile(bio=user.bio))
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-    
-    # Create a new Profile instance and link it with the user
-    db_profile = Profile(bio=user.bio, user_id=db_user.id)
-    db.add(db_profile)
-    db.commit()
-    db.refresh(db_profile)
+    await db.commit()
+    profiles_page_cache.clear()
     
     # Return combined UserResponse with bio from Profile
-    return UserResponse(id=db_user.id, name=db_user.name, bio=db_profile.bio)
+    return UserResponse(id=db_user.id, name=db_user.name, bio=db_user.profile.bio)
 
 
 
 # Endpoint to get all users with profiles
 @app.get("/users",response_model=List[UserResponse]) # 
-def read_users(db: Session = Depends(get_db)):
-    # Using `joinedload` to eagerly load profiles with users
-    users = db.query(User).all()
+async def read_users(limit: int = Query(50, ge=1, le=500), offset: int = Query(0, ge=0), db: AsyncSession = Depends(get_db)):
+    # Using `selectinload` to eagerly load profiles with users
+    result = await db.execute(USERS_PAGE, {"limit": limit, "offset": offset})
+    users = result.scalars().all()
 
-    return [
+    users = [
         UserResponse(
             id=user.id,
             name=user.name,
@@ -100,83 +189,82 @@ def read_users(db: Session = Depends(get_db)):
         )
         for user in users
     ]
+    return Response(content=USERS_ADAPTER.dump_json(users), media_type="application/json")
 
 # Endpoint to get user and their profile by user ID
 @app.get("/users/{user_id}", response_model=UserResponse)
-def read_user(user_id: int, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
-    if user is None:
-        raise HTTPException(status_code=404, detail="User not found")
-    # Return User with bio from Profile
-    if user.profile:
-        return UserResponse(id=user.id, name=user.name, bio=user.profile.bio)
-    else:
-        raise HTTPException(status_code=404, detail="Profile not found")
+async def read_user(user_id: int, db: AsyncSession = Depends(get_db)):
+    body = user_cache.get(user_id)
+    if body is None:
+        user = await db.get(User, user_id, options=[selectinload(User.profile), raiseload("*", sql_only=True)])
+        if user is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        # Return User with bio from Profile
+        if user.profile:
+            body = user_cache[user_id] = UserResponse(id=user.id, name=user.name, bio=user.profile.bio).model_dump_json()
+        else:
+            raise HTTPException(status_code=404, detail="Profile not found")
+    return Response(content=body, media_type="application/json")
 
 @app.put("/users/{user_id}",response_model=UserResponse)
-def update_user(user_id: int, payload: UserCreate, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
+async def update_user(user_id: int, payload: UserCreate, db: AsyncSession = Depends(get_db)):
+    user = await db.get(User, user_id)
     user.name = payload.name
 
-    profile = db.query(Profile).filter(Profile.user_id == user_id).first()
+    result = await db.execute(PROFILE_BY_USER_ID, {"user_id": user_id})
+    profile = result.scalar_one_or_none()
     profile.bio = payload.bio
 
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
+    user_cache.pop(user_id, None)
+    profiles_page_cache.clear()
     return UserResponse(id=user.id, name=user.name, bio=profile.bio)
 
 
 # Endpoint to delete user
-@app.delete("/users/{user_id}")
-def delete_user(user_id: int, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
+@app.delete("/users/{user_id}", response_model=dict)
+async def delete_user(user_id: int, db: AsyncSession = Depends(get_db)):
+    user = await db.get(User, user_id)
     if user is None:
         raise HTTPException(status_code=404,detail="User not found")
-    db.delete(user)
-    db.commit()
+    await db.delete(user)
+    await db.commit()
+    user_cache.pop(user_id, None)
+    profiles_page_cache.clear()
     return {"message" : "User has been deleted"}
 
 # Endpoint to create a new profile for an existing user
 @app.post("/profiles/", response_model=ProfileResponse)
-def create_profile(profile: ProfileCreate, db: Session = Depends(get_db)):
+async def create_profile(profile: ProfileCreate, db: AsyncSession = Depends(get_db)):
     # Check if the user exists
-    user = db.query(User).filter(User.id == profile.user_id).first()
+    user = await db.get(User, profile.user_id)
     if user is None:
         raise HTTPException(status_code=404, detail="User not found")
 
     # Create a new Profile instance
     db_profile = Profile(bio=profile.bio, user_id=profile.user_id)
     db.add(db_profile)
-    db.commit()
-    db.refresh(db_profile)
+    await db.commit()
+    await db.refresh(db_profile)
+    user_cache.pop(profile.user_id, None)
+    profiles_page_cache.clear()
     return db_profile
 
 # Endpoint to get profile by profile ID
 @app.get("/profiles/{profile_id}", response_model=ProfileResponse)
-def read_profile(profile_id: int, db: Session = Depends(get_db)):
-    profile = db.query(Profile).filter(Profile.id == profile_id).first()
+async def read_profile(profile_id: int, db: AsyncSession = Depends(get_db)):
+    profile = await db.get(Profile, profile_id, options=[raiseload("*", sql_only=True)])
     if profile is None:
         raise HTTPException(status_code=404, detail="Profile not found")
     return profile
 
-# Endpoint to get profile by profile ID
+# Endpoint to get all profiles
 @app.get("/profiles", response_model=List[ProfileResponse])
-def read_all_profile(db: Session = Depends(get_db)):
-    profile = db.query(Profile).all()
-    print(profile)
-    print("I am ")
-    if profile is None:
-        raise HTTPException(status_code=404, detail="Profile not found")
-    return profile
-
-@app.get("/profiles1", response_model=List[ProfileResponse])
-def read_all_profile1(db: Session = Depends(get_db)):
-    profiles = db.query(Profile).all()
-
-    # Debugging - print out profiles and their user_ids
-    for profile in profiles:
-        print(f"Profile ID: {profile.id}, User ID: {profile.user_id}")
-    if not profiles:
-        raise HTTPException(status_code=404, detail="No profiles found")
-
-    return profiles
+async def read_all_profile(limit: int = Query(50, ge=1, le=500), offset: int = Query(0, ge=0), db: AsyncSession = Depends(get_db)):
+    body = profiles_page_cache.get((limit, offset))
+    if body is None:
+        result = await db.execute(PROFILES_PAGE, {"limit": limit, "offset": offset})
+        profile = result.scalars().all()
+        body = profiles_page_cache[(limit, offset)] = PROFILES_ADAPTER.dump_json(PROFILES_ADAPTER.validate_python(profile))
+    return Response(content=body, media_type="application/json")
@@ -0,0 +1,129 @@
+import os
+import tempfile
+
+# The X-SQL-Count listener and middleware are only installed when this is set at import
+os.environ["SQL_COUNT_HEADER"] = "1"
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.exc import InvalidRequestError
+
+# SQLite resolves the apps' relative database paths against the working directory
+# when the engines are created, so import them from a scratch directory to keep test databases out of the checkout
+DB_DIR = tempfile.mkdtemp()
+_cwd = os.getcwd()
+os.chdir(DB_DIR)
+try:
+    import one_to_many
+    import one_to_one
+finally:
+    os.chdir(_cwd)
+
+
+def sql_count(response):
+    assert response.status_code == 200, response.text
+    return int(response.headers["X-SQL-Count"])
+
+
+def remove_database(engine):
+    path = os.path.join(DB_DIR, os.path.basename(engine.url.database))
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+@pytest.fixture
+def many_client():
+    # Each test starts from empty tables and empty response caches; the lifespan
+    # disposes the engine on exit, so the database file can be removed afterwards
+    for cache in (one_to_many.user_cache, one_to_many.order_cache, one_to_many.orders_page_cache):
+        cache.clear()
+    with TestClient(one_to_many.app) as client:
+        yield client
+    remove_database(one_to_many.engine)
+
+
+@pytest.fixture
+def one_client():
+    for cache in (one_to_one.user_cache, one_to_one.profiles_page_cache):
+        cache.clear()
+    with TestClient(one_to_one.app) as client:
+        yield client
+    remove_database(one_to_one.engine)
+
+
+def seed_users_with_orders(client, users, orders_per_user, start=0):
+    for i in range(start, start + users):
+        user = client.post("/users/", json={"username": f"user{i}", "email": f"user{i}@example.com"}).json()
+        for j in range(orders_per_user):
+            client.post(
+                f"/users/{user['id']}/orders/",
+                json={"product_name": f"product{j}", "quantity": 1, "price": 9.99},
+            )
+
+
+def seed_users_with_profiles(client, users, start=0):
+    for i in range(start, start + users):
+        client.post("/users/", json={"name": f"user{i}", "bio": f"bio {i}"})
+
+
+@pytest.mark.parametrize(
+    "url, budget",
+    [
+        ("/users/", 2),  # users + one selectin query for all their orders
+        ("/orders", 1),  # orders joined with their users
+        ("/users/1", 2),
+        ("/orders/1", 1),
+    ],
+)
+def test_one_to_many_query_budget(many_client, url, budget):
+    seed_users_with_orders(many_client, users=5, orders_per_user=3)
+    assert sql_count(many_client.get(url)) <= budget
+
+
+@pytest.mark.parametrize(
+    "url, budget",
+    [
+        ("/users", 2),  # users + one selectin query for their profiles
+        ("/users/1", 2),
+        ("/profiles", 1),
+    ],
+)
+def test_one_to_one_query_budget(one_client, url, budget):
+    seed_users_with_profiles(one_client, users=5)
+    assert sql_count(one_client.get(url)) <= budget
+
+
+def test_one_to_many_eager_loads_do_not_grow_with_parents(many_client):
+    seed_users_with_orders(many_client, users=2, orders_per_user=2)
+    before = [sql_count(many_client.get(url)) for url in ("/users/", "/orders")]
+
+    seed_users_with_orders(many_client, users=8, orders_per_user=3, start=2)
+    after = [sql_count(many_client.get(url)) for url in ("/users/", "/orders")]
+
+    assert after == before == [2, 1]
+
+
+def test_one_to_one_eager_loads_do_not_grow_with_parents(one_client):
+    seed_users_with_profiles(one_client, users=2)
+    before = [sql_count(one_client.get(url)) for url in ("/users", "/profiles")]
+
+    seed_users_with_profiles(one_client, users=8, start=2)
+    after = [sql_count(one_client.get(url)) for url in ("/users", "/profiles")]
+
+    assert after == before == [2, 1]
+
+
+def test_raiseload_guard_rejects_unplanned_lazy_loads(many_client):
+    # Runs on the TestClient's event loop so the session shares the app's connections
+    seed_users_with_orders(many_client, users=2, orders_per_user=1)
+
+    async def touch_unloaded_relationship():
+        async with one_to_many.SessionLocal() as db:
+            result = await db.execute(one_to_many.ORDERS_PAGE, {"limit": 50, "offset": 0})
+            order = result.scalars().first()
+            # Order.user is joined in, but User.orders is not part of ORDERS_PAGE
+            return order.user.orders
+
+    with pytest.raises(InvalidRequestError, match="lazy='raise_on_sql'"):
+        many_client.portal.call(touch_unloaded_relationship)